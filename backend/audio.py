@@ -3,17 +3,24 @@ from pathlib import Path
 
 LOOPS_DIR = Path(__file__).parent / 'loops'
 wave_obj = None
+loaded_audio_filename = None
 
 def load_audio_file(filename):
     """Loads an audio file."""
-    global wave_obj
+    global loaded_audio_filename
     wav_file_path = LOOPS_DIR / filename
     if wav_file_path.exists():
-        print(f"Loading audio file: {wav_file_path}")
-        wave_obj = sa.WaveObject.from_wave_file(str(wav_file_path))
+        load_audio_path(wav_file_path)
+        loaded_audio_filename = filename
     else:
         print(f"Warning: Audio file not found at {wav_file_path}")
 
+def load_audio_path(wav_file_path: Path):
+    """Loads an audio file from an arbitrary path (e.g. a cached tempo render)."""
+    global wave_obj
+    print(f"Loading audio file: {wav_file_path}")
+    wave_obj = sa.WaveObject.from_wave_file(str(wav_file_path))
+
 def play_audio():
     """Plays the loaded audio file."""
     if wave_obj:
@@ -0,0 +1,221 @@
+import argparse
+import math
+import random
+import threading
+import time
+
+import mido
+
+PPQN = 24  # MIDI clock pulses per quarter note
+PULSES_PER_SONGPOS = 6  # Song Position Pointer counts 16th notes
+QUANTIZE_MODES = ('off', 'beat', 'bar')
+MIN_BPM = 20  # First intervals outside this range are treated as glitches, not tempo
+MAX_BPM = 300
+
+
+def _schedule_timer(delay: float, callback):
+    """Runs a callback on a daemon timer thread after `delay` seconds."""
+    timer = threading.Timer(delay, callback)
+    timer.daemon = True
+    timer.start()
+
+
+class ClockFollower:
+    """Follows incoming MIDI clock and launches callbacks on beat/bar boundaries.
+
+    Raw clock timestamps jitter by a few milliseconds (USB polling, the
+    rtmidi thread, the sender itself), so tick times are smoothed with an
+    alpha-beta filter: a second-order PLL that tracks both the phase and the
+    period of the clock. The last raw-minus-predicted error is reported as
+    the phase error and its running RMS as the jitter.
+
+    `now` and `schedule` are injectable so synthetic clock streams can be
+    fed through without real time passing.
+    """
+
+    def __init__(self, beats_per_bar: int = 4, alpha: float = 0.1, lock_ticks: int = 2 * PPQN,
+                 now=time.monotonic, schedule=_schedule_timer):
+        self.beats_per_bar = beats_per_bar
+        self.alpha = alpha
+        # Benedict-Bordner gain for the period term: slightly underdamped, trading a
+        # little overshoot for faster settling than the critically damped pair.
+        self.beta = alpha * alpha / (2 - alpha)
+        self.lock_ticks = lock_ticks
+        self._now = now
+        self._schedule = schedule
+        self._lock = threading.Lock()
+        self.running = False
+        self.tick = -1  # Song position (in pulses) of the last pulse while running
+        self.tick_time = None  # Filtered timestamp of the last clock pulse
+        self.period = None  # Filtered seconds per clock pulse
+        self.phase_error = 0.0
+        self.jitter = 0.0
+        self._ticks_seen = 0
+        self._generation = 0  # Bumped on Start/Stop to invalidate queued launches
+
+    @property
+    def locked(self) -> bool:
+        """True once enough pulses have been seen for the estimate to settle.
+
+        The period gain is small, so the filter is still ringing after one beat;
+        by two beats bar predictions are within a few milliseconds.
+        """
+        return self.period is not None and self._ticks_seen >= self.lock_ticks
+
+    @property
+    def bpm(self):
+        return 60.0 / (self.period * PPQN) if self.period else None
+
+    def process(self, msg: mido.Message, now: float = None) -> bool:
+        """Updates the clock state from a MIDI message.
+
+        Returns True when the message is a clock pulse that starts a new beat.
+        """
+        if now is None:
+            now = self._now()
+        with self._lock:
+            if msg.type == 'start':
+                # The first pulse after Start is song position 0.
+                self.running = True
+                self.tick = -1
+                self._generation += 1
+            elif msg.type == 'continue':
+                # Resume from the current (or cued) song position.
+                self.running = True
+            elif msg.type == 'songpos':
+                # Cue a position; the next pulse after Continue lands on it.
+                self.tick = msg.pos * PULSES_PER_SONGPOS - 1
+            elif msg.type == 'stop':
+                self.running = False
+                self._generation += 1
+            elif msg.type == 'clock':
+                self._on_tick(now)
+                return self.running and self.tick % PPQN == 0
+        return False
+
+    def _on_tick(self, now: float):
+        # Sources keep pulsing while stopped: the filter tracks every pulse,
+        # but the song position only advances while running.
+        if self.running:
+            self.tick += 1
+        if self.tick_time is None:
+            self.tick_time = now
+            return
+        if self.period is None:
+            # Pulses bunched into one USB packet (or a long pause) give an impossible
+            # first interval; measure again from this pulse instead.
+            interval = now - self.tick_time
+            if 60.0 / (MAX_BPM * PPQN) <= interval <= 60.0 / (MIN_BPM * PPQN):
+                self.period = interval
+            self.tick_time = now
+            return
+
+        predicted = self.tick_time + self.period
+        error = now - predicted
+        if abs(error) > 8 * self.period:
+            # The clock source paused or jumped; resync rather than drag the filter.
+            self.tick_time = now
+            self.period = None
+            self._ticks_seen = 0
+            return
+
+        self.tick_time = predicted + self.alpha * error
+        self.period += self.beta * error
+        self.phase_error = error
+        self.jitter = math.sqrt(0.95 * self.jitter ** 2 + 0.05 * error ** 2)
+        self._ticks_seen += 1
+
+    def time_of_tick(self, tick: int) -> float:
+        """Predicts the timestamp of a clock pulse from the filtered estimate."""
+        return self.tick_time + (tick - self.tick) * self.period
+
+    def queue_launch(self, callback, quantize: str = 'bar') -> float:
+        """Runs `callback` on the next beat or bar boundary and returns the delay.
+
+        Falls back to running it immediately when quantizing is off or the
+        clock is not running and locked.
+        """
+        with self._lock:
+            generation = self._generation
+            if quantize == 'off' or not (self.running and self.locked):
+                delay = None
+            else:
+                unit = PPQN * (self.beats_per_bar if quantize == 'bar' else 1)
+                now = self._now()
+                position = self.tick + (now - self.tick_time) / self.period
+                target = (math.floor(position / unit) + 1) * unit
+                delay = max(0.0, self.time_of_tick(target) - now)
+
+        if delay is None:
+            callback()
+            return 0.0
+
+        def launch():
+            # Drop launches queued on a grid that a Stop or Start has since replaced.
+            if self.running and self._generation == generation:
+                callback()
+
+        self._schedule(delay, launch)
+        return delay
+
+    def status(self) -> dict:
+        """Returns the current tempo/phase estimate as a UI message."""
+        return {
+            'type': 'clock_status',
+            'running': self.running,
+            'locked': self.locked,
+            'bpm': round(self.bpm, 2) if self.bpm else None,
+            'beat': self.tick // PPQN if self.tick >= 0 else None,
+            'phase_error_ms': round(self.phase_error * 1000, 2),
+            'jitter_ms': round(self.jitter * 1000, 2),
+        }
+
+
+class SimulatedClockPort:
+    """Stand-in MIDI input port that yields a jittered clock stream.
+
+    Advances a fake clock as it yields, so pass its `now` method to a
+    ClockFollower to replay the stream without waiting in real time.
+    """
+
+    def __init__(self, bpm: float, beats: int, jitter_ms: float, seed: int = None):
+        self.bpm = bpm
+        self.beats = beats
+        self.jitter = jitter_ms / 1000
+        self._random = random.Random(seed)
+        self._time = 0.0
+
+    def now(self) -> float:
+        return self._time
+
+    def ideal_time(self, tick: int) -> float:
+        return tick * 60.0 / (self.bpm * PPQN)
+
+    def __iter__(self):
+        yield mido.Message('start')
+        for tick in range(self.beats * PPQN):
+            self._time = self.ideal_time(tick) + self._random.gauss(0.0, self.jitter)
+            yield mido.Message('clock')
+        yield mido.Message('stop')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Feed a synthetic jittered MIDI clock through the clock follower")
+    parser.add_argument("--bpm", type=float, default=120.0, help="Tempo of the simulated clock")
+    parser.add_argument("--beats", type=int, default=64, help="Number of beats to simulate")
+    parser.add_argument("--jitter-ms", type=float, default=2.0, help="Standard deviation of the clock jitter")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for a repeatable stream")
+    args = parser.parse_args()
+
+    port = SimulatedClockPort(args.bpm, args.beats, args.jitter_ms, args.seed)
+    follower = ClockFollower(now=port.now)
+    squared_errors = []
+    for msg in port:
+        if follower.process(msg):
+            print(follower.status())
+        if msg.type == 'clock' and follower.locked:
+            squared_errors.append((follower.tick_time - port.ideal_time(follower.tick)) ** 2)
+
+    filtered_ms = math.sqrt(sum(squared_errors) / len(squared_errors)) * 1000 if squared_errors else float('nan')
+    print(f"Estimated {follower.bpm:.3f} BPM (actual {args.bpm}), "
+          f"raw jitter {follower.jitter * 1000:.2f} ms, filtered beat-grid error {filtered_ms:.2f} ms")
@@ -1,9 +1,13 @@
 import socket
+from pathlib import Path
 
 # --- Configuration ---
 DEFAULT_HOST = "0.0.0.0"
 DEFAULT_PORT = 8765
 DEFAULT_TRIGGER_NOTE = 60  # MIDI note for C3 (for WAV playback)
+DEFAULT_QUANTIZE = "bar"  # Launch triggered loops on the next 'beat', 'bar' or 'off'
+RENDER_CACHE_DIR = Path(__file__).parent / 'renders'  # Tempo-shifted loop renders
+RENDER_CACHE_MAX_BYTES = 200 * 1024 * 1024  # Disk budget for the render cache
 
 def get_midi_port_names(hostname: str):
     if "Kermit" in hostname:
@@ -11,9 +11,11 @@ from config import (
     DEFAULT_HOST,
     DEFAULT_PORT,
     DEFAULT_TRIGGER_NOTE,
+    DEFAULT_QUANTIZE,
     get_midi_port_names
 )
 from audio import load_audio_file
+from clock import QUANTIZE_MODES
 from midi import midi_listener, find_midi_port
 from server import websocket_handler, midi_broadcaster
 import midi
@@ -42,7 +44,7 @@ async def main(args):
 
     loop = asyncio.get_running_loop()
     midi_thread = threading.Thread(
-        target=midi_listener, args=(midi_in_port_name, args.trigger_note, loop, midi_message_queue), daemon=True
+        target=midi_listener, args=(midi_in_port_name, args.trigger_note, loop, midi_message_queue, args.quantize), daemon=True
     )
     midi_thread.start()
 
@@ -64,6 +66,7 @@ if __name__ == "__main__":
     parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port for the WebSocket server")
     
     parser.add_argument("--trigger-note", type=int, default=DEFAULT_TRIGGER_NOTE, help="MIDI note number to trigger the WAV loop")
+    parser.add_argument("--quantize", type=str, choices=QUANTIZE_MODES, default=DEFAULT_QUANTIZE, help="Launch triggered loops on the next beat or bar of incoming MIDI clock")
     parser.add_argument("--loop-file", type=str, default=None, help="Name of the audio file in the 'loops' directory")
     args = parser.parse_args()
 
@@ -2,10 +2,15 @@ import mido
 import asyncio
 from pathlib import Path
 
+from clock import ClockFollower
+
 LOOPS_DIR = Path(__file__).parent / 'loops'
 midi_out_port = None
 loaded_midi_file = None
 current_midi_trigger_note = None
+clock_follower = ClockFollower()
+
+CLOCK_MESSAGE_TYPES = ('clock', 'start', 'stop', 'continue', 'songpos')
 
 def format_midi_message(msg: mido.Message) -> str:
     """Formats a mido message into a human-readable string."""
@@ -55,10 +60,9 @@ def list_midi_files_in_loops_dir() -> list[str]:
                 midi_files.append(f.name)
     return sorted(midi_files)
 
-def midi_listener(port_name: str, trigger_note: int, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
-    """Listens for MIDI messages and puts them into a queue."""
-    from audio import play_audio
-    global loaded_midi_file, current_midi_trigger_note
+def midi_listener(port_name: str, trigger_note: int, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue,
+                  quantize: str = 'bar'):
+    """Opens the MIDI input port and handles its messages."""
     if not port_name:
         print("\n-- No MIDI input port specified. MIDI listener will not start. --")
         return
@@ -72,22 +76,44 @@ def midi_listener(port_name: str, trigger_note: int, loop: asyncio.AbstractEvent
         with mido.open_input(target_port) as inport:
             print(f"Successfully opened MIDI input port: {inport.name}")
             print(f"Listening for MIDI on {inport.name}")
-            for msg in inport:
-                midi_activity_message = {
-                    'type': 'midi_activity',
-                    'direction': 'in',
-                    'message': format_midi_message(msg)
-                }
-                loop.call_soon_threadsafe(queue.put_nowait, midi_activity_message)
-
-                if msg.type == 'note_on' and msg.note == trigger_note:
-                    print(f"Trigger note {trigger_note} received! Playing WAV loop.")
-                    play_audio()
-                elif msg.type == 'note_on' and current_midi_trigger_note is not None and msg.note == current_midi_trigger_note:
-                    print(f"MIDI Play Trigger note {current_midi_trigger_note} received! Playing MIDI file.")
-                    if loaded_midi_file:
-                        asyncio.run_coroutine_threadsafe(play_midi_file(queue), loop)
-                    else:
-                        print("Warning: No MIDI file loaded to play.")
+            handle_midi_messages(inport, trigger_note, loop, queue, quantize)
     except (IOError, OSError) as e:
         print(f"Error opening MIDI input port: {e}")
+
+def handle_midi_messages(inport, trigger_note: int, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue,
+                         quantize: str = 'bar', follower: ClockFollower = None):
+    """Puts MIDI messages into a queue, follows MIDI clock and launches triggered loops.
+
+    `inport` can be any iterable of mido messages, e.g. a stand-in port
+    replaying a recorded or synthetic clock stream, paired with a
+    `follower` that reads the stand-in's clock.
+    """
+    from audio import play_audio
+    follower = follower or clock_follower
+
+    def launch_midi_file():
+        asyncio.run_coroutine_threadsafe(play_midi_file(queue), loop)
+
+    for msg in inport:
+        if msg.type in CLOCK_MESSAGE_TYPES:
+            # Clock arrives 24 times per beat; report a status per beat instead of every pulse.
+            if follower.process(msg) or msg.type != 'clock':
+                loop.call_soon_threadsafe(queue.put_nowait, follower.status())
+            continue
+
+        midi_activity_message = {
+            'type': 'midi_activity',
+            'direction': 'in',
+            'message': format_midi_message(msg)
+        }
+        loop.call_soon_threadsafe(queue.put_nowait, midi_activity_message)
+
+        if msg.type == 'note_on' and msg.note == trigger_note:
+            delay = follower.queue_launch(play_audio, quantize)
+            print(f"Trigger note {trigger_note} received! Playing WAV loop in {delay:.3f}s.")
+        elif msg.type == 'note_on' and current_midi_trigger_note is not None and msg.note == current_midi_trigger_note:
+            if loaded_midi_file:
+                delay = follower.queue_launch(launch_midi_file, quantize)
+                print(f"MIDI Play Trigger note {current_midi_trigger_note} received! Playing MIDI file in {delay:.3f}s.")
+            else:
+                print("Warning: No MIDI file loaded to play.")
@@ -0,0 +1,253 @@
+import argparse
+import asyncio
+import math
+import os
+import threading
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import mido
+import numpy as np
+
+from config import RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES
+
+LOOPS_DIR = Path(__file__).parent / 'loops'
+DEFAULT_MIDI_TEMPO = 500000  # 120 BPM, the MIDI spec default
+MIN_TEMPO_RATIO = 0.5  # Stretching further than this sounds too smeared to use
+MAX_TEMPO_RATIO = 2.0
+
+# A single worker keeps background renders from competing with playback on the Pi.
+_render_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render")
+
+
+def read_source_bpm(midi_file: mido.MidiFile) -> float:
+    """Returns the BPM of the first set_tempo message in a MIDI file."""
+    for track in midi_file.tracks:
+        for msg in track:
+            if msg.type == 'set_tempo':
+                return mido.tempo2bpm(msg.tempo)
+    return mido.tempo2bpm(DEFAULT_MIDI_TEMPO)
+
+
+def read_loop_bpm(wav_filename: str) -> float:
+    """Returns the source BPM of a loop, read from its matching MIDI file."""
+    source_midi = (LOOPS_DIR / wav_filename).with_suffix('.mid')
+    if not source_midi.exists():
+        raise ValueError(f"No MIDI file to read the source tempo of {wav_filename} from")
+    return read_source_bpm(mido.MidiFile(str(source_midi)))
+
+
+def normalise_bpm(bpm: float) -> float:
+    """Rounds a BPM to the 0.1 resolution renders are cached at."""
+    bpm = float(bpm)
+    if not math.isfinite(bpm) or bpm <= 0:
+        raise ValueError(f"BPM must be a positive number, got {bpm}")
+    return round(bpm, 1)
+
+
+def tempo_ratio(bpm: float, source_bpm: float) -> float:
+    """Returns the stretch ratio for a target BPM, rejecting ones too far from the source."""
+    ratio = bpm / source_bpm
+    if not MIN_TEMPO_RATIO <= ratio <= MAX_TEMPO_RATIO:
+        raise ValueError(f"{bpm} BPM is too far from the loop's {source_bpm:.1f} BPM to render")
+    return ratio
+
+
+def scale_midi_tempo(midi_file: mido.MidiFile, ratio: float) -> mido.MidiFile:
+    """Returns a copy of a MIDI file whose event times are scaled by 1/ratio.
+
+    Event times are stored in ticks, so scaling every set_tempo message
+    stretches all events uniformly without touching the note data.
+    """
+    scaled = mido.MidiFile(type=midi_file.type, ticks_per_beat=midi_file.ticks_per_beat)
+    found_tempo = False
+    for track in midi_file.tracks:
+        new_track = mido.MidiTrack()
+        for msg in track:
+            if msg.type == 'set_tempo':
+                found_tempo = True
+                msg = msg.copy(tempo=max(1, round(msg.tempo / ratio)))
+            new_track.append(msg)
+        scaled.tracks.append(new_track)
+    if not found_tempo and scaled.tracks:
+        tempo = max(1, round(DEFAULT_MIDI_TEMPO / ratio))
+        scaled.tracks[0].insert(0, mido.MetaMessage('set_tempo', tempo=tempo, time=0))
+    return scaled
+
+
+def time_stretch(samples: np.ndarray, ratio: float, frame_size: int = 1024, hop: int = 512,
+                 tolerance: int = 256) -> np.ndarray:
+    """Time-stretches audio by `ratio` (>1 is faster) without changing pitch.
+
+    Uses WSOLA: output frames are laid down every `hop` samples, and each
+    input frame is read from near its nominal position `hop * ratio` later,
+    shifted by up to `tolerance` samples to the offset that best
+    cross-correlates with the natural continuation of the previous frame.
+    This keeps overlapping frames in phase, so tones are not cancelled.
+    `samples` has shape (frames, channels) and the result has length
+    round(len(samples) / ratio), so a stretched loop stays loop-length.
+    """
+    n_in, channels = samples.shape
+    n_out = max(1, int(round(n_in / ratio)))
+    # Periodic Hann window: at 50% overlap the frames sum to a constant gain.
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(frame_size) / frame_size)).astype(np.float32)
+
+    n_frames = int(np.ceil(n_out / hop)) + 1
+    nominal = tolerance + np.round(np.arange(n_frames) * hop * ratio).astype(np.int64)
+
+    # Pad so every candidate region and continuation can be read without bounds checks.
+    tail = int(nominal[-1]) + tolerance + frame_size + hop - n_in - tolerance
+    padded = np.concatenate([
+        np.zeros((tolerance, channels), dtype=np.float32),
+        samples.astype(np.float32),
+        np.zeros((max(0, tail), channels), dtype=np.float32),
+    ])
+    mono = padded.mean(axis=1)
+
+    region_len = frame_size + 2 * tolerance
+    fft_size = 1 << int(np.ceil(np.log2(region_len + frame_size)))
+    output = np.zeros(((n_frames - 1) * hop + frame_size, channels), dtype=np.float32)
+    norm = np.zeros(len(output), dtype=np.float32)
+
+    start = int(nominal[0])
+    for k in range(n_frames):
+        if k > 0:
+            # Cross-correlate the previous frame's natural continuation with every
+            # candidate offset in the search region in one FFT.
+            template = mono[start + hop:start + hop + frame_size]
+            region_start = int(nominal[k]) - tolerance
+            region = mono[region_start:region_start + region_len]
+            corr = np.fft.irfft(np.fft.rfft(region, fft_size) * np.conj(np.fft.rfft(template, fft_size)), fft_size)
+            start = region_start + int(np.argmax(corr[:2 * tolerance + 1]))
+        out_start = k * hop
+        output[out_start:out_start + frame_size] += padded[start:start + frame_size] * window[:, None]
+        norm[out_start:out_start + frame_size] += window
+
+    output /= np.maximum(norm, 1e-3)[:, None]
+    return output[:n_out]
+
+
+def read_wav(path: Path):
+    """Reads a 16-bit PCM WAV file into a float32 (frames, channels) array."""
+    with wave.open(str(path), 'rb') as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"Only 16-bit WAV files are supported: {path.name}")
+        channels = wav.getnchannels()
+        framerate = wav.getframerate()
+        data = np.frombuffer(wav.readframes(wav.getnframes()), dtype='<i2')
+    samples = data.reshape(-1, channels).astype(np.float32) / 32768.0
+    return samples, framerate
+
+
+def write_wav(path: Path, samples: np.ndarray, framerate: int):
+    """Writes a float32 (frames, channels) array as a 16-bit PCM WAV file."""
+    pcm = np.clip(samples * 32768.0, -32768, 32767).astype('<i2')
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(samples.shape[1])
+        wav.setsampwidth(2)
+        wav.setframerate(framerate)
+        wav.writeframes(pcm.tobytes())
+
+
+class RenderCache:
+    """On-disk cache of tempo-shifted WAV/MIDI loop pairs with LRU eviction."""
+
+    def __init__(self, cache_dir: Path = RENDER_CACHE_DIR, max_bytes: int = RENDER_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _paths_for(self, wav_filename: str, bpm: float):
+        # Normalise the BPM so 120, 120.0 and 120.04 all share one render.
+        name = f"{Path(wav_filename).stem}@{normalise_bpm(bpm):g}bpm"
+        return self.cache_dir / f"{name}.wav", self.cache_dir / f"{name}.mid"
+
+    def lookup(self, wav_filename: str, bpm: float):
+        """Returns the cached (wav_path, midi_path) for a BPM, or None if not rendered."""
+        wav_path, midi_path = self._paths_for(wav_filename, bpm)
+        if not (wav_path.exists() and midi_path.exists()):
+            return None
+        # Touch the files so eviction treats them as most recently used.
+        try:
+            os.utime(wav_path)
+            os.utime(midi_path)
+        except FileNotFoundError:
+            # Evicted by the render worker between the check and the touch.
+            return None
+        return wav_path, midi_path
+
+    def render(self, wav_filename: str, bpm: float):
+        """Renders a loop at the given BPM, returning the cached paths.
+
+        Raises ValueError for BPMs that are not positive or would stretch the
+        loop by more than MIN_TEMPO_RATIO..MAX_TEMPO_RATIO.
+        """
+        # Render at the same rounded BPM that names the file.
+        bpm = normalise_bpm(bpm)
+        with self._lock:
+            cached = self.lookup(wav_filename, bpm)
+            if cached:
+                return cached
+
+            source_wav = LOOPS_DIR / wav_filename
+            source_midi = source_wav.with_suffix('.mid')
+            if not source_midi.exists():
+                raise ValueError(f"No MIDI file to read the source tempo of {wav_filename} from")
+            midi_file = mido.MidiFile(str(source_midi))
+            ratio = tempo_ratio(bpm, read_source_bpm(midi_file))
+
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            wav_path, midi_path = self._paths_for(wav_filename, bpm)
+            print(f"Rendering {wav_filename} at {bpm} BPM (ratio {ratio:.3f})")
+            samples, framerate = read_wav(source_wav)
+            # Write to a temporary name first so a half-written render is never looked up.
+            tmp_path = wav_path.with_name(wav_path.name + '.tmp')
+            try:
+                write_wav(tmp_path, time_stretch(samples, ratio), framerate)
+                scale_midi_tempo(midi_file, ratio).save(str(midi_path))
+                os.replace(tmp_path, wav_path)
+            finally:
+                tmp_path.unlink(missing_ok=True)
+
+            self._evict(keep=wav_path.stem)
+            return wav_path, midi_path
+
+    async def render_async(self, wav_filename: str, bpm: float):
+        """Renders a loop on the background worker without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_render_executor, self.render, wav_filename, bpm)
+
+    def _evict(self, keep: str = None):
+        """Deletes least recently used renders until the cache fits its disk budget."""
+        renders = {}
+        for path in self.cache_dir.iterdir():
+            if path.is_file() and path.suffix in ('.wav', '.mid'):
+                entry = renders.setdefault(path.stem, {'size': 0, 'mtime': 0.0, 'paths': []})
+                stat = path.stat()
+                entry['size'] += stat.st_size
+                entry['mtime'] = max(entry['mtime'], stat.st_mtime)
+                entry['paths'].append(path)
+
+        total = sum(entry['size'] for entry in renders.values())
+        for stem, entry in sorted(renders.items(), key=lambda item: item[1]['mtime']):
+            if total <= self.max_bytes:
+                break
+            if stem == keep:
+                continue
+            print(f"Evicting cached render: {stem}")
+            for path in entry['paths']:
+                path.unlink(missing_ok=True)
+            total -= entry['size']
+
+
+render_cache = RenderCache()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-render tempo variants of a loop into the render cache")
+    parser.add_argument("loop_file", type=str, help="Name of the WAV file in the 'loops' directory")
+    parser.add_argument("bpms", type=float, nargs='+', help="Target tempos to render")
+    args = parser.parse_args()
+
+    for target_bpm in args.bpms:
+        render_cache.render(args.loop_file, target_bpm)
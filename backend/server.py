@@ -6,10 +6,13 @@ from pathlib import Path
 
 from deploy import run_deploy_script
 from midi import list_midi_files_in_loops_dir, play_midi_file
+from render_cache import normalise_bpm, read_loop_bpm, render_cache, tempo_ratio
 import midi
 import audio
 
 connected_clients = set()
+# The event loop only holds weak references to tasks, so keep background renders alive here.
+render_tasks = set()
 LOOPS_DIR = Path(__file__).parent / 'loops'
 
 async def midi_broadcaster(queue: asyncio.Queue):
@@ -24,6 +27,52 @@ async def midi_broadcaster(queue: asyncio.Queue):
                 # Otherwise, it's a plain string message (e.g., old MIDI messages)
                 websockets.broadcast(connected_clients, message)
 
+async def render_tempo_variant(websocket, wav_filename: str, bpm: float):
+    """Renders a tempo variant on the background worker and reports the result."""
+    try:
+        await render_cache.render_async(wav_filename, bpm)
+        await websocket.send(json.dumps({'type': 'bpm_rendered', 'filename': wav_filename, 'bpm': bpm}))
+        print(f"Rendered {wav_filename} at {bpm} BPM")
+    except Exception as e:
+        print(f"Error rendering {wav_filename} at {bpm} BPM: {e}")
+        try:
+            await websocket.send(json.dumps({"type": "error", "message": f"Could not render {wav_filename} at {bpm} BPM: {e}"}))
+        except websockets.ConnectionClosed:
+            pass
+
+def start_render(websocket, wav_filename: str, bpm: float):
+    """Starts a background render, keeping a reference until it finishes."""
+    task = asyncio.create_task(render_tempo_variant(websocket, wav_filename, bpm))
+    render_tasks.add(task)
+    task.add_done_callback(render_tasks.discard)
+
+def is_number(value) -> bool:
+    """True for JSON numbers (bool is an int subclass, so exclude it)."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+async def set_loop_bpm(websocket, wav_filename: str, bpm: float):
+    """Switches the loaded loop to a cached tempo variant, or back to the original."""
+    source_bpm = read_loop_bpm(wav_filename)
+    if normalise_bpm(bpm) == normalise_bpm(source_bpm):
+        # The source tempo needs no render; reload the original files.
+        source_wav = LOOPS_DIR / wav_filename
+        audio.load_audio_path(source_wav)
+        midi.loaded_midi_file = mido.MidiFile(str(source_wav.with_suffix('.mid')))
+    else:
+        # Reject out-of-range tempos now rather than after a failed background render.
+        tempo_ratio(normalise_bpm(bpm), source_bpm)
+        cached = render_cache.lookup(wav_filename, bpm)
+        if not cached:
+            # Not rendered yet: render in the background so the next request is a cache hit.
+            await websocket.send(json.dumps({'type': 'bpm_not_cached', 'bpm': bpm}))
+            start_render(websocket, wav_filename, bpm)
+            return
+        wav_path, midi_path = cached
+        audio.load_audio_path(wav_path)
+        midi.loaded_midi_file = mido.MidiFile(str(midi_path))
+    await websocket.send(json.dumps({'type': 'bpm_changed', 'bpm': bpm}))
+    print(f"Switched {wav_filename} to {bpm} BPM")
+
 async def websocket_handler(websocket, queue: asyncio.Queue):
     """Handles a single WebSocket connection."""
     connected_clients.add(websocket)
@@ -65,6 +114,23 @@ async def websocket_handler(websocket, queue: asyncio.Queue):
                     else:
                         await websocket.send("MIDI_ERROR: Missing filename or trigger_note for load_midi command.")
                         print("Missing filename or trigger_note for load_midi command.")
+                elif msg_data.get('command') == 'render_bpm':
+                    bpms = msg_data.get('bpms')
+                    if audio.loaded_audio_filename and isinstance(bpms, list) and bpms and all(is_number(bpm) for bpm in bpms):
+                        for bpm in bpms:
+                            start_render(websocket, audio.loaded_audio_filename, bpm)
+                    else:
+                        await websocket.send(json.dumps({"type": "error", "message": "render_bpm needs a loaded loop and a list of numeric bpms."}))
+                elif msg_data.get('command') == 'set_bpm':
+                    bpm = msg_data.get('bpm')
+                    if audio.loaded_audio_filename and is_number(bpm):
+                        try:
+                            await set_loop_bpm(websocket, audio.loaded_audio_filename, bpm)
+                        except Exception as e:
+                            await websocket.send(json.dumps({"type": "error", "message": f"Could not switch to {bpm} BPM: {e}"}))
+                            print(f"Error switching to {bpm} BPM: {e}")
+                    else:
+                        await websocket.send(json.dumps({"type": "error", "message": "set_bpm needs a loaded loop and a numeric bpm."}))
                 else:
                     print("Received unknown JSON command:", msg_data)
                     await websocket.send(json.dumps({"type": "error", "message": "Unknown command"}))
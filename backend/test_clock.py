@@ -0,0 +1,125 @@
+import math
+
+import mido
+
+from clock import PPQN, ClockFollower, SimulatedClockPort
+
+PULSE = 60.0 / (120 * PPQN)  # Seconds per pulse at 120 BPM
+
+
+def feed(follower: ClockFollower, times, start: bool = True):
+    """Feeds clock pulses at the given timestamps into a follower."""
+    if start:
+        follower.process(mido.Message('start'), times[0])
+    for t in times:
+        follower.process(mido.Message('clock'), t)
+
+
+def test_jittered_stream_tracks_tempo_and_beat_grid():
+    for seed in range(10):
+        port = SimulatedClockPort(120, 32, jitter_ms=2, seed=seed)
+        follower = ClockFollower(now=port.now)
+        squared_errors = []
+        for msg in port:
+            follower.process(msg)
+            if msg.type == 'clock' and follower.locked:
+                squared_errors.append((follower.tick_time - port.ideal_time(follower.tick)) ** 2)
+        grid_error = math.sqrt(sum(squared_errors) / len(squared_errors))
+        assert abs(follower.bpm - 120) < 0.5, (seed, follower.bpm)
+        assert grid_error < 0.002, (seed, grid_error)
+        assert 0.001 < follower.jitter < 0.004, (seed, follower.jitter)
+
+
+def test_queue_launch_lands_on_next_beat_and_bar():
+    for quantize, unit in (('beat', PPQN), ('bar', 4 * PPQN)):
+        port = SimulatedClockPort(120, 16, jitter_ms=2, seed=1)
+        delays = []
+        follower = ClockFollower(now=port.now, schedule=lambda delay, callback: delays.append(delay))
+        for msg in port:
+            follower.process(msg)
+            if msg.type == 'clock' and follower.tick == 5 * PPQN + 10:
+                queued_at = port.now()
+                follower.queue_launch(lambda: None, quantize)
+        target = (5 * PPQN + 10) // unit * unit + unit
+        assert len(delays) == 1
+        assert abs(queued_at + delays[0] - port.ideal_time(target)) < 0.005, (quantize, delays)
+
+
+def test_queue_launch_is_immediate_without_a_running_clock():
+    launched = []
+    follower = ClockFollower(schedule=lambda delay, callback: None)
+    assert follower.queue_launch(lambda: launched.append(True), 'bar') == 0.0
+    assert launched == [True]
+
+
+def test_stop_and_start_drop_queued_launches():
+    for restart in (False, True):
+        timers, launched = [], []
+        follower = ClockFollower(schedule=lambda delay, callback: timers.append(callback))
+        feed(follower, [i * PULSE for i in range(4 * PPQN)])
+        now = 4 * PPQN * PULSE
+        follower._now = lambda: now
+        follower.queue_launch(lambda: launched.append(True), 'bar')
+        follower.process(mido.Message('stop'), now)
+        if restart:
+            follower.process(mido.Message('start'), now)
+        timers[0]()
+        assert launched == [], restart
+
+
+def test_queued_launch_fires_while_clock_keeps_running():
+    timers, launched = [], []
+    follower = ClockFollower(schedule=lambda delay, callback: timers.append(callback))
+    feed(follower, [i * PULSE for i in range(4 * PPQN)])
+    follower._now = lambda: 4 * PPQN * PULSE
+    follower.queue_launch(lambda: launched.append(True), 'beat')
+    timers[0]()
+    assert launched == [True]
+
+
+def test_resync_after_gap_relocks_at_the_same_tempo():
+    times = [i * PULSE for i in range(4 * PPQN)]
+    times += [times[-1] + 3.0 + i * PULSE for i in range(4 * PPQN)]
+    follower = ClockFollower()
+    feed(follower, times)
+    assert follower.locked
+    assert abs(follower.bpm - 120) < 0.01
+
+
+def test_bunched_first_pulses_do_not_block_lock():
+    # Two pulses in one USB packet, then a steady 120 BPM clock.
+    times = [0.0, 0.0002] + [0.0002 + (i + 1) * PULSE for i in range(500)]
+    follower = ClockFollower()
+    feed(follower, times)
+    assert follower.locked
+    assert abs(follower.bpm - 120) < 0.01
+
+
+def test_song_position_holds_while_stopped_and_follows_songpos():
+    follower = ClockFollower()
+    times = [i * PULSE for i in range(300)]
+    feed(follower, times[:200])
+    follower.process(mido.Message('stop'), times[199])
+    for t in times[200:230]:
+        follower.process(mido.Message('clock'), t)
+    follower.process(mido.Message('continue'), times[229])
+    follower.process(mido.Message('clock'), times[230])
+    assert follower.tick == 200
+
+    follower.process(mido.Message('stop'), times[230])
+    follower.process(mido.Message('songpos', pos=32), times[230])
+    follower.process(mido.Message('continue'), times[230])
+    assert follower.process(mido.Message('clock'), times[231])
+    assert follower.tick == 32 * 6
+
+
+if __name__ == "__main__":
+    test_jittered_stream_tracks_tempo_and_beat_grid()
+    test_queue_launch_lands_on_next_beat_and_bar()
+    test_queue_launch_is_immediate_without_a_running_clock()
+    test_stop_and_start_drop_queued_launches()
+    test_queued_launch_fires_while_clock_keeps_running()
+    test_resync_after_gap_relocks_at_the_same_tempo()
+    test_bunched_first_pulses_do_not_block_lock()
+    test_song_position_holds_while_stopped_and_follows_songpos()
+    print("Clock follower tracks tempo, quantizes launches and resyncs.")
@@ -0,0 +1,155 @@
+import os
+import tempfile
+from pathlib import Path
+
+import mido
+import numpy as np
+
+from render_cache import (
+    DEFAULT_MIDI_TEMPO,
+    RenderCache,
+    normalise_bpm,
+    read_source_bpm,
+    scale_midi_tempo,
+    time_stretch,
+)
+
+LOOP = 'Better With Brushes.wav'
+SAMPLE_RATE = 44100
+
+
+def stretched_sine(frequency: float, ratio: float):
+    """Stretches a two-second sine and returns its trimmed output."""
+    t = np.arange(SAMPLE_RATE * 2) / SAMPLE_RATE
+    samples = np.sin(2 * np.pi * frequency * t).astype(np.float32)[:, None]
+    stretched = time_stretch(samples, ratio)[:, 0]
+    assert len(stretched) == round(len(samples) / ratio)
+    # Ignore the edges, where the first and last frames are not fully overlapped.
+    return stretched[2048:-2048]
+
+
+def test_stretched_sine_keeps_rms_and_frequency():
+    for frequency in (110, 440, 1000, 3000):
+        for ratio in (0.5, 0.8, 1.1, 1.25, 1.5, 2.0):
+            body = stretched_sine(frequency, ratio)
+            rms = np.sqrt(np.mean(body ** 2))
+            spectrum = np.abs(np.fft.rfft(body * np.hanning(len(body))))
+            peak = np.argmax(spectrum) * SAMPLE_RATE / len(body)
+            assert abs(rms - np.sqrt(0.5)) < 0.05, (frequency, ratio, rms)
+            assert abs(peak - frequency) < 2, (frequency, ratio, peak)
+
+
+def make_midi(tempo: int = None) -> mido.MidiFile:
+    """Builds a one-bar MIDI file, optionally with a set_tempo message."""
+    midi_file = mido.MidiFile(ticks_per_beat=480)
+    track = mido.MidiTrack()
+    if tempo is not None:
+        track.append(mido.MetaMessage('set_tempo', tempo=tempo, time=0))
+    track.append(mido.Message('note_on', note=60, velocity=100, time=0))
+    track.append(mido.Message('note_off', note=60, velocity=0, time=4 * 480))
+    midi_file.tracks.append(track)
+    return midi_file
+
+
+def test_scale_midi_tempo_scales_length():
+    midi_file = make_midi(tempo=1000000)  # 60 BPM, one bar is 4 seconds
+    scaled = scale_midi_tempo(midi_file, 2.0)
+    assert abs(scaled.length - midi_file.length / 2) < 1e-6
+    assert abs(read_source_bpm(scaled) - 120) < 0.01
+
+
+def test_scale_midi_tempo_inserts_default_tempo():
+    scaled = scale_midi_tempo(make_midi(), 1.25)
+    tempos = [msg.tempo for msg in scaled.tracks[0] if msg.type == 'set_tempo']
+    assert tempos == [round(DEFAULT_MIDI_TEMPO / 1.25)]
+    assert abs(scaled.length - make_midi().length / 1.25) < 1e-6
+
+
+def test_normalise_bpm_keys_renders_at_one_decimal():
+    cache = RenderCache(Path('/nonexistent'))
+    assert cache._paths_for(LOOP, 120) == cache._paths_for(LOOP, 120.04) == cache._paths_for(LOOP, 119.96)
+    assert cache._paths_for(LOOP, 120) != cache._paths_for(LOOP, 120.1)
+    assert cache._paths_for(LOOP, 92.5)[0].name == 'Better With Brushes@92.5bpm.wav'
+    for bad in (0, -50, float('nan'), float('inf')):
+        try:
+            normalise_bpm(bad)
+        except ValueError:
+            continue
+        raise AssertionError(f"{bad} BPM was accepted")
+
+
+def test_render_rejects_ratios_outside_range():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = RenderCache(Path(cache_dir))
+        # The bundled loop is about 63.9 BPM, so 30 and 200 are outside 0.5-2x.
+        for bpm in (30, 200, -50, 0):
+            try:
+                cache.render(LOOP, bpm)
+            except ValueError:
+                continue
+            raise AssertionError(f"{bpm} BPM was rendered")
+        assert list(Path(cache_dir).iterdir()) == []
+
+
+def test_render_uses_rounded_bpm_and_caches():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = RenderCache(Path(cache_dir))
+        wav_path, midi_path = cache.render(LOOP, 80.04)
+        assert wav_path.name == 'Better With Brushes@80bpm.wav'
+        assert abs(read_source_bpm(mido.MidiFile(str(midi_path))) - 80.0) < 0.001
+        assert cache.lookup(LOOP, 80) == (wav_path, midi_path)
+        assert cache.lookup(LOOP, 90) is None
+        assert sorted(path.suffix for path in Path(cache_dir).iterdir()) == ['.mid', '.wav']
+
+
+def write_render(cache: RenderCache, bpm: float, mtime: float, size: int = 1000):
+    """Writes a fake render pair of `size` bytes with the given mtime."""
+    for path in cache._paths_for(LOOP, bpm):
+        path.write_bytes(b'\0' * (size // 2))
+        os.utime(path, (mtime, mtime))
+
+
+def test_eviction_drops_least_recently_used_first():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = RenderCache(Path(cache_dir), max_bytes=2000)
+        write_render(cache, 70, mtime=1000)
+        write_render(cache, 80, mtime=2000)
+        write_render(cache, 90, mtime=3000)
+        cache._evict()
+        assert cache.lookup(LOOP, 70) is None
+        assert cache.lookup(LOOP, 80) and cache.lookup(LOOP, 90)
+
+
+def test_lookup_refreshes_recency():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = RenderCache(Path(cache_dir), max_bytes=2000)
+        write_render(cache, 70, mtime=1000)
+        write_render(cache, 80, mtime=2000)
+        write_render(cache, 90, mtime=3000)
+        assert cache.lookup(LOOP, 70)
+        cache._evict()
+        assert cache._paths_for(LOOP, 70)[0].exists()
+        assert not cache._paths_for(LOOP, 80)[0].exists()
+
+
+def test_eviction_never_drops_kept_render():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = RenderCache(Path(cache_dir), max_bytes=1000)
+        write_render(cache, 70, mtime=1000)
+        write_render(cache, 80, mtime=2000)
+        cache._evict(keep=cache._paths_for(LOOP, 70)[0].stem)
+        assert cache._paths_for(LOOP, 70)[0].exists()
+        assert not cache._paths_for(LOOP, 80)[0].exists()
+
+
+if __name__ == "__main__":
+    test_stretched_sine_keeps_rms_and_frequency()
+    test_scale_midi_tempo_scales_length()
+    test_scale_midi_tempo_inserts_default_tempo()
+    test_normalise_bpm_keys_renders_at_one_decimal()
+    test_render_rejects_ratios_outside_range()
+    test_render_uses_rounded_bpm_and_caches()
+    test_eviction_drops_least_recently_used_first()
+    test_lookup_refreshes_recency()
+    test_eviction_never_drops_kept_render()
+    print("Render cache stretches, scales, keys and evicts as expected.")